@@ -7,11 +7,21 @@ Supports anonymous submission with configurable address.
 """
 
 import argparse
+import atexit
+import json
+import logging
 import os
+import queue
 import random
+import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from urllib.parse import urlparse
 from zoneinfo import ZoneInfo
 
 from playwright.sync_api import (
@@ -21,12 +31,18 @@ from playwright.sync_api import (
 )
 
 
+log = logging.getLogger("rat311")
+
 # Constants
 FORM_DIRECT_URL = "https://portal.311.nyc.gov/sr-step/?id=fb797007-e3f3-f011-92b8-7c1e52e6db72&stepid=4a51f5a5-b04c-e811-a835-000d3a33b1e4"
 # Main Rat or Mouse Complaint article page (fallback)
 FORM_ARTICLE_URL = "https://portal.311.nyc.gov/article/?kanumber=KA-01107"
 
-DESCRIPTIONS = [
+# Complaints are timestamped in NYC local time
+NYC_TIMEZONE = "America/New_York"
+NYC_TZ = ZoneInfo(NYC_TIMEZONE)
+
+DESCRIPTIONS = (
     "This is getting worse and has become a health hazard. It is a loop: open food and trash attracts rats, rats spread more contamination, and then even more rats appear. Management is doing nothing to break that cycle. The neglect is disgusting and unacceptable; please inspect and enforce correction immediately.",
     "Rat activity is increasing week after week, including daytime sightings on the sidewalk. Trash is left open with no secure bins or tight lids, so food is always available. This is not self-correcting; it keeps feeding a worsening rat loop. Total management neglect is making conditions disgusting and unacceptable.",
     "This infestation keeps escalating because garbage is exposed every day. The pattern is clear: food and open trash bring rats, and more rats make the situation worse. There are still no consistently covered bins and no meaningful action from management. Please issue violations and require immediate abatement.",
@@ -39,10 +55,24 @@ DESCRIPTIONS = [
     "This property shows chronic conditions that attract rodents and now escalating daytime rat traffic. Open trash and lack of compliant covered bins are the direct drivers. Management has taken no effective action, and the result is a worsening, unsanitary cycle. Conditions are unacceptable and require urgent enforcement.",
     "The situation is getting worse because trash is always open and accessible. It is a feedback loop: food attracts rats, rats multiply, and each week there are more sightings. There is still no adequate covered container system in place. This level of neglect is disgusting and poses a serious health concern.",
     "There are visibly more rats now than in prior months, with activity during the day. Exposed garbage and missing or uncovered bins are allowing continuous feeding and breeding. Management inaction has turned this into an ongoing worsening hazard. Please document violations, mandate covered containers, and reinspect.",
-]
+)
 
 ADDITIONAL_DETAILS = "Trash, Improper garbage storage or disposal, Open lot"
 
+# Additional Details options to try in order (trash/garbage-related for rat complaints)
+ADDITIONAL_DETAILS_PREFERENCES = (
+    ADDITIONAL_DETAILS,
+    "Trash",
+    "Garbage",
+    "Improper",
+    "Open lot",
+    "Food",
+    "Waste",
+)
+
+# Autocomplete suggestions naming one of these look like a real NYC address
+BOROUGHS = ("MANHATTAN", "BROOKLYN", "QUEENS", "BRONX", "STATEN ISLAND")
+
 # Default address (can be overridden via environment variables)
 DEFAULT_ADDRESS = "932 Carroll St"
 DEFAULT_CITY = "Brooklyn"
@@ -58,6 +88,364 @@ DEFAULT_CONTACT_STATE = "NY"
 DEFAULT_CONTACT_ZIP = "11225"
 DEFAULT_CONTACT_COUNTRY = "United States"
 
+# Screenshots, HTML dumps and submission details land here (created once in main)
+ARTIFACTS_DIR = Path("artifacts")
+# Writes debug artifacts to disk off the failing submission's path; main()
+# waits for it before exiting
+ARTIFACT_WRITER = ThreadPoolExecutor(max_workers=2, thread_name_prefix="artifacts")
+
+# Cookies/local storage carried between runs (can be overridden via STATE_PATH)
+DEFAULT_STATE_PATH = ".playwright/state.json"
+# Serializes writes to the state file when submissions run in parallel
+STATE_LOCK = threading.Lock()
+# Sessions older than this are discarded so the portal issues fresh cookies and
+# tokens before rotation invalidates the saved ones
+STATE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+# Upper bound on parallel submissions (WORKERS env var); each worker runs its
+# own browser since Playwright's sync API is bound to the thread that started it
+MAX_WORKERS = 8
+
+# Chromium flags that trim rendering work the form flow does not need. Images
+# are not disabled engine-wide: block_unneeded_requests drops them, except the
+# map images the address picker needs.
+CHROMIUM_ARGS = (
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--no-first-run",
+    "--disable-breakpad",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--disable-features=TranslateUI",
+)
+VIEWPORT = {"width": 1024, "height": 768}
+
+# Subresources the automation never interacts with. Stylesheets are kept because
+# visibility checks (":visible", is_visible) depend on computed styles, and
+# reCAPTCHA is left alone so the portal's own checks are not disturbed.
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+BLOCKED_URL_PATTERNS = (
+    "google-analytics",
+    "googletagmanager",
+    "doubleclick",
+    "qualtrics",
+    "hotjar",
+    "clarity.ms",
+    "connect.facebook.net",
+    "nr-data.net",
+    "siteimproveanalytics",
+)
+# Never blocked: the Step 2 address picker needs its ESRI/ArcGIS map resources
+# (tiles, sprites, glyphs) to geocode and enable "Select Address". Matched on
+# the request's hostname (or a parent domain), never the rest of the URL.
+ALLOWED_HOSTS = (
+    "arcgis.com",
+    "arcgisonline.com",
+    "esri.com",
+)
+
+# Selectors for the portal's form controls, defined once and reused by every step
+SELECTORS = {
+    # Article page (fallback navigation): onclick-only "Report rats" anchor
+    "report_button_onclick": (
+        "a[onclick*='createServiceRequest']:has-text('Report rats')"
+    ),
+    # Wizard navigation
+    "next_button": "#NextButton",
+    "next_button_fallback": (
+        "button:has-text('Next'), button:has-text('Continue'), "
+        "a:has-text('Next'), a:has-text('Continue'), "
+        "input[type='submit'][value*='Next'], input[type='submit'][value*='Continue'], "
+        "[role='button']:has-text('Next'), [role='button']:has-text('Continue')"
+    ),
+    "submit_button": (
+        "input[value='Complete and Submit'], button:has-text('Complete and Submit')"
+    ),
+    "submit_button_fallback": "#NextButton.submit-btn, input[value*='Submit']",
+    "active_step": (
+        ".progress-step.active:has-text('{step}'), "
+        "[aria-current='step']:has-text('{step}')"
+    ),
+    "captcha": (
+        "iframe[src*='recaptcha']",
+        ".g-recaptcha",
+        "#captcha",
+        "[class*='recaptcha']",
+    ),
+    # Step 1: What
+    "step_form": "form",
+    "problem_detail": "#n311_problemdetailid_select",
+    "additional_details": "select[id*='additionaldetails'], select[id*='additional']",
+    "datetime_observed": (
+        "input[id='n311_datetimeobserved']:visible, "
+        "input[placeholder*='M/D/YYYY']:visible"
+    ),
+    "recurring_group": "fieldset:has-text('recurring'), div:has-text('recurring')",
+    # Step 2: Where
+    "location_type": "#n311_locationtypeid_select",
+    "location_detail": "#n311_locationdetailid_select",
+    "address_search_button": "#SelectAddressWhere, .address-picker-btn",
+    "address_search_input": "#address-search-box-input",
+    "autocomplete_list": ".ui-autocomplete, .ui-menu",
+    "autocomplete_item": ".ui-menu-item, .ui-autocomplete li",
+    "select_address_button": "#SelectAddressMap",
+    "map_canvas": ".modal canvas, .esri-view-surface canvas",
+    "modal_cancel": "#CancelButton, .modal button[data-dismiss='modal'], .modal .close",
+    # Step 3: Who
+    "contact_section": "fieldset[aria-label*='Contact'], input[id*='firstname']",
+    "contact_first_name": (
+        "input#n311_portaldobcontactfirstname",
+        "input[id*='contactfirstname']",
+        "input[id*='firstname']",
+    ),
+    "contact_last_name": (
+        "input#n311_portaldobcontactlastname",
+        "input[id*='contactlastname']",
+        "input[id*='lastname']",
+    ),
+    "contact_email": (
+        "input#n311_contactemail",
+        "input[id*='contactemail']",
+        "input[type='email']",
+        "input[id*='email']",
+    ),
+    "contact_address_line1": (
+        "input#n311_portalcustomeraddressline1",
+        "input[id*='addressline1']",
+    ),
+    "contact_address_line2": (
+        "input#n311_portalcustomeraddressline2",
+        "input[id*='addressline2']",
+    ),
+    "contact_city": (
+        "input#n311_portalcustomeraddresscity",
+        "input[id*='addresscity']",
+        "input[id*='city']",
+    ),
+    "contact_state": (
+        "input#n311_portalcustomeraddressstate",
+        "input[id*='addressstate']",
+        "input[id*='state']",
+    ),
+    "contact_zip": (
+        "input#n311_portalcustomeraddresszip",
+        "input[id*='addresszip']",
+        "input[id*='zip']",
+        "input[id*='postal']",
+    ),
+    "contact_country": (
+        "input[id*='country']",
+    ),
+    # Step 4: Review
+    "review_submit": "input[value*='Submit'], button:has-text('Submit')",
+    "confirmation_text": "text=/thank you/i",
+    "confirmation_container": "main",
+}
+
+# Article page (fallback navigation): the accordion heading to expand, and the
+# accessible name shared by every variant of the "Report rats" link
+RESIDENTIAL_SECTION_TEXT = "Residential Addresses"
+REPORT_BUTTON_NAME_RE = re.compile(r"Report rats", re.I)
+
+# Path of the service request wizard; every step posts back to it
+WIZARD_PATH = "/sr-step/"
+
+# Accessible name of the wizard's Next/Continue button, for portal variants
+# that render it without the #NextButton id
+NEXT_BUTTON_NAME_RE = re.compile(r"^(Next|Continue)$")
+
+# 311 service request numbers (e.g. 311-12345678). Anchored to that format so
+# phone numbers and dates on the page are never mistaken for one. Matched in
+# Python against the confirmation page text instead of a DOM-wide locator scan.
+CONFIRMATION_NUMBER_RE = re.compile(r"\b311-\d{8}\b")
+# Broader confirmation wording, checked when the "thank you" wait times out
+CONFIRMATION_WORDS_RE = re.compile(r"thank you|confirmation|submitted", re.I)
+
+# Returns the confirmation page's main content text (or the body's, if there is
+# no non-empty main element) so both checks run on one round-trip's result
+CONFIRMATION_TEXT_JS = """selector => {
+    const main = document.querySelector(selector);
+    return (main && main.innerText.trim() ? main : document.body).innerText;
+}"""
+
+# Clicks the article's "Report rats" link in a single round-trip. The link is a
+# createServiceRequest() trigger, so it works without expanding the accordion.
+CLICK_REPORT_BUTTON_JS = """() => {
+    const links = [...document.querySelectorAll('a')].filter(
+        a => /Report rats/i.test(a.textContent)
+    );
+    const link = links.find(
+        a => (a.getAttribute('onclick') || '').includes('createServiceRequest')
+    ) || links[0];
+    if (!link) return false;
+    link.click();
+    return true;
+}"""
+
+# In-page helpers shared by the scripts below, so they all use the same
+# visibility test, value setter and option preference order:
+# - isVisible: has layout boxes and is not visibility:hidden
+# - setValue: what Playwright's fill() does (focus, set value, input event)
+#   plus a change event and blur so the portal's validators see the new value
+# - pickPreferred: the first preference (in order) that an option's text
+#   contains, else the first non-placeholder option (undefined if none)
+JS_HELPERS = """
+    const isVisible = el =>
+        el.getClientRects().length > 0 &&
+        getComputedStyle(el).visibility !== 'hidden';
+    const setValue = (el, value) => {
+        el.focus();
+        el.value = value;
+        el.dispatchEvent(new Event('input', {bubbles: true}));
+        el.dispatchEvent(new Event('change', {bubbles: true}));
+        el.blur();
+    };
+    const pickPreferred = (select, preferences) => {
+        const options = [...select.options].filter(o => o.value);
+        return preferences
+            .map(p => options.find(o => o.text.toLowerCase().includes(p.toLowerCase())))
+            .find(Boolean) || options[0];
+    };
+"""
+
+# Fills each field's first visible match in a single round-trip. Returns the
+# names of the fields that were filled.
+FILL_VISIBLE_FIELDS_JS = (
+    "fields => {"
+    + JS_HELPERS
+    + """
+    const filled = [];
+    for (const field of fields) {
+        const input = field.selectors
+            .flatMap(selector => [...document.querySelectorAll(selector)])
+            .find(isVisible);
+        if (!input) continue;
+        setValue(input, field.value);
+        filled.push(field.name);
+    }
+    return filled;
+}"""
+)
+
+# Picks a dropdown option in one round-trip using pickPreferred. Returns the
+# option's value and text, or null if the dropdown has no options yet.
+PICK_OPTION_JS = (
+    "(select, preferences) => {"
+    + JS_HELPERS
+    + """
+    const option = pickPreferred(select, preferences);
+    return option ? {value: option.value, text: option.text.trim()} : null;
+}"""
+)
+
+# After Location Type is chosen, the portal either populates Location Detail or
+# enables the address search straight away. Polls both in one in-page wait and
+# reports which one became ready ("detail" or "search").
+LOCATION_READY_JS = """({detail, search}) => {
+    if (document.querySelector(detail + ' option[value]:not([value=""])')) {
+        return 'detail';
+    }
+    const button = document.querySelector(search);
+    if (button && !button.disabled && !document.querySelector(detail)) {
+        return 'search';
+    }
+    return false;
+}"""
+
+# Fills the rest of Step 1 (Additional Details, Description, recurring "Yes") in
+# a single round-trip once Problem Detail is selected. Date/Time Observed is left
+# to fill_observed_datetime, since its date picker parses typed input. Opt-in
+# via BATCH_FILL=1; returns what was set so the caller can log it.
+FILL_STEP1_JS = (
+    "args => {"
+    + JS_HELPERS
+    + """
+    const firstVisible = selector =>
+        [...document.querySelectorAll(selector)].find(isVisible);
+    const result = {};
+
+    const additional = args.additionalDetails && firstVisible(args.additionalDetails);
+    if (additional) {
+        const option = pickPreferred(additional, args.preferences);
+        if (option) {
+            setValue(additional, option.value);
+            result.additionalDetails = option.text.trim();
+        }
+    }
+
+    const label = [...document.querySelectorAll('label')]
+        .find(l => l.textContent.includes('Description'));
+    let description = label && label.htmlFor && document.getElementById(label.htmlFor);
+    if (!description || !isVisible(description)) {
+        description = firstVisible('textarea');
+    }
+    if (description) {
+        setValue(description, args.description);
+        result.description = true;
+    }
+
+    const yes = [...document.querySelectorAll('input[type=radio]')].find(radio => {
+        const labels = [...(radio.labels || [])].map(l => l.textContent.trim());
+        if (!labels.includes('Yes')) return false;
+        // Only the radio's own question container, never an ancestor like <form>
+        const question = radio.closest('fieldset, .form-group, tr');
+        return !!question && question.textContent.toLowerCase().includes('recurring');
+    });
+    if (yes) {
+        if (!yes.checked) yes.click();
+        result.recurring = true;
+    }
+    return result;
+}"""
+)
+
+# Reports whether any selector's first match is a visible CAPTCHA widget large
+# enough to be a real challenge, in a single round-trip. isVisible keeps
+# reCAPTCHA's pre-rendered challenge (inside a visibility:hidden container) from
+# counting, and the v3 badge is skipped.
+CAPTCHA_VISIBLE_JS = (
+    "selectors => {"
+    + JS_HELPERS
+    + """
+    return selectors.some(selector => {
+        const el = document.querySelector(selector);
+        if (!el || !isVisible(el) || el.closest('.grecaptcha-badge')) return false;
+        const rect = el.getBoundingClientRect();
+        return rect.width > 50 && rect.height > 50;
+    });
+}"""
+)
+
+# Element that only exists once a given form step has rendered
+STEP_MARKERS = {
+    1: SELECTORS["problem_detail"],
+    2: SELECTORS["location_type"],
+    3: SELECTORS["contact_section"],
+    4: SELECTORS["review_submit"],
+}
+
+# Resolves the current step in one round-trip: the progress indicator first,
+# then the step markers. Understands the ":has-text('...')" extension used in
+# SELECTORS, which document.querySelector does not.
+GET_CURRENT_STEP_JS = r"""({activeStep, markers}) => {
+    const exists = selector => selector.split(/,\s*(?![^(]*\))/).some(part => {
+        const match = part.match(/^(.*):has-text\('(.*)'\)$/);
+        if (!match) return document.querySelector(part) !== null;
+        const text = match[2].toLowerCase();
+        return [...document.querySelectorAll(match[1])].some(
+            el => el.textContent.toLowerCase().includes(text)
+        );
+    });
+    for (const [step] of markers) {
+        if (exists(activeStep.replaceAll('{step}', step))) return step;
+    }
+    for (const [step, selector] of markers) {
+        if (exists(selector)) return step;
+    }
+    return null;
+}"""
+
 
 def normalize_us_zip(zip_code):
     """Normalize ZIP code to first 5 digits when possible."""
@@ -101,26 +489,91 @@ def get_form_url():
     return os.environ.get("FORM_URL", FORM_DIRECT_URL)
 
 
+def get_state_path():
+    """Get browser storage state path from environment variables with default."""
+    return Path(os.environ.get("STATE_PATH", DEFAULT_STATE_PATH))
+
+
+def get_workers(job_count):
+    """Number of submissions to run in parallel (WORKERS, default 1)."""
+    try:
+        workers = int(os.environ.get("WORKERS", "1"))
+    except ValueError:
+        workers = 1
+    return max(1, min(workers, MAX_WORKERS, job_count))
+
+
+def get_cdp_url():
+    """Get the CDP endpoint of an already-running Chromium (CDP_URL), if any."""
+    return os.environ.get("CDP_URL")
+
+
+def get_debug():
+    """Whether failures capture a full-page screenshot (DEBUG=1)."""
+    return os.environ.get("DEBUG") == "1"
+
+
+def get_batch_fill():
+    """Whether Step 1 is filled with a single page.evaluate (BATCH_FILL=1)."""
+    return os.environ.get("BATCH_FILL") == "1"
+
+
 def get_current_datetime_nyc():
     """Returns current date/time in America/New_York timezone."""
-    return datetime.now(ZoneInfo("America/New_York"))
+    return datetime.now(NYC_TZ)
+
+
+def format_observed_datetime(dt):
+    """Format a datetime as the form expects (M/D/YYYY h:mm AM/PM).
 
+    Built with arithmetic rather than strftime's "%-m" style flags, which are a
+    glibc extension and fail on Windows.
+    """
+    hour = (dt.hour - 1) % 12 + 1
+    meridiem = "AM" if dt.hour < 12 else "PM"
+    return f"{dt.month}/{dt.day}/{dt.year} {hour}:{dt.minute:02d} {meridiem}"
 
-def select_random_description():
-    """Select a random description from the pre-written variations."""
-    return random.choice(DESCRIPTIONS)
 
+def select_random_descriptions(count):
+    """Select count random descriptions from the pre-written variations.
 
-def save_submission_details(config, description, nyc_datetime):
-    """Save submission details to a file for notification."""
-    artifacts_dir = Path("artifacts")
-    artifacts_dir.mkdir(exist_ok=True)
+    Descriptions are distinct until every variation has been used, so
+    complaints filed in the same run do not share the same text.
+    """
+    picks = []
+    while len(picks) < count:
+        picks.extend(
+            random.sample(DESCRIPTIONS, min(count - len(picks), len(DESCRIPTIONS)))
+        )
+    return picks
+
+
+def block_unneeded_requests(route):
+    """Abort requests for assets and trackers the form flow does not need."""
+    request = route.request
+    hostname = urlparse(request.url).hostname or ""
+    if any(
+        hostname == host or hostname.endswith(f".{host}") for host in ALLOWED_HOSTS
+    ):
+        route.continue_()
+    elif request.resource_type in BLOCKED_RESOURCE_TYPES or any(
+        pattern in request.url for pattern in BLOCKED_URL_PATTERNS
+    ):
+        route.abort()
+    else:
+        route.continue_()
+
+
+def save_submission_details(config, description, datetime_str, append=False):
+    """Save submission details to a file for notification.
 
+    With append=True the details are added after those already saved in this run.
+    """
     details = f"""Address: {config["address"]}, {config["city"]}, {config["state"]} {config["zip"]}
 Location Type: 3+ Family Apt. Building
 Problem Detail: Condition Attracting Rodents
 Additional Details: Garbage
-Date/Time Observed: {nyc_datetime.strftime("%-m/%-d/%Y %-I:%M %p")}
+Date/Time Observed: {datetime_str}
 Recurring: Yes
 Contact Name: {config["contact_first_name"]} {config["contact_last_name"]}
 Contact Email: {config["contact_email"]}
@@ -128,117 +581,234 @@ Contact Address: {config["contact_address_line1"]}, {config["contact_city"]}, {c
 
 Description: {description}"""
 
-    details_path = artifacts_dir / "submission_details.txt"
+    details_path = ARTIFACTS_DIR / "submission_details.txt"
+    if append and details_path.exists():
+        details = f"{details_path.read_text()}\n\n{'-' * 40}\n\n{details}"
     details_path.write_text(details)
-    print(f"Submission details saved: {details_path}")
+    log.info("Submission details saved: %s", details_path)
 
 
-def save_debug_artifacts(page, error_name="error"):
-    """Save screenshot and HTML on failure to artifacts/ directory."""
-    artifacts_dir = Path("artifacts")
-    artifacts_dir.mkdir(exist_ok=True)
+def get_state_meta_path(state_path):
+    """Sidecar file recording when the saved session was first established."""
+    return state_path.with_name(f"{state_path.stem}.meta.json")
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file and swap it in so readers never see a partial file."""
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def load_storage_state(state_path):
+    """Read the saved browser state and when its session started.
+
+    Returns (state, started_at), or (None, None) to start a fresh session when
+    the state is missing, unreadable, or older than STATE_MAX_AGE_SECONDS. Both
+    files are read under STATE_LOCK so a parallel worker's save is never seen
+    half-written.
+    """
+    with STATE_LOCK:
+        try:
+            meta = json.loads(get_state_meta_path(state_path).read_text())
+            started_at = float(meta["started_at"])
+            state = json.loads(state_path.read_text())
+        except FileNotFoundError:
+            return None, None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning("Ignoring unreadable browser state %s: %s", state_path, e)
+            return None, None
+    if time.time() - started_at > STATE_MAX_AGE_SECONDS:
+        log.info("Browser state is over a week old; starting a fresh session")
+        return None, None
+    return state, started_at
+
+
+def save_storage_state(context, state_path, started_at=None):
+    """Persist cookies and local storage so the next run starts with a warm session.
+
+    started_at is when the context's session was first established (None for a
+    fresh one, which starts now); it is saved alongside the state so the weekly
+    refresh counts from the original bootstrap, not from the latest save.
+    """
+    try:
+        state = context.storage_state()
+        meta = {"started_at": time.time() if started_at is None else started_at}
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        # State and start time are swapped in together so they always match
+        with STATE_LOCK:
+            write_json_atomic(state_path, state)
+            write_json_atomic(get_state_meta_path(state_path), meta)
+        log.info("Browser state saved: %s", state_path)
+    except Exception as e:
+        log.warning("Failed to save browser state: %s", e)
 
+
+def write_artifact(label, path, data):
+    """Write one captured debug artifact (bytes or text) to disk."""
+    try:
+        if isinstance(data, bytes):
+            path.write_bytes(data)
+        else:
+            path.write_text(data)
+        log.info("%s saved: %s", label, path)
+    except OSError as e:
+        log.warning("Failed to save %s: %s", label, e)
+
+
+def save_debug_artifacts(page, error_name="error", full_page=False):
+    """Save screenshot and HTML on failure to artifacts/ directory.
+
+    Screenshots cover the viewport as JPEG unless full_page=True is passed.
+    Both are captured from the page here; the disk writes happen on
+    ARTIFACT_WRITER.
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
     # Save screenshot
-    screenshot_path = artifacts_dir / f"{error_name}_{timestamp}.png"
+    screenshot_path = ARTIFACTS_DIR / f"{error_name}_{timestamp}.jpg"
     try:
-        page.screenshot(path=str(screenshot_path), full_page=True)
-        print(f"Screenshot saved: {screenshot_path}")
+        screenshot = page.screenshot(full_page=full_page, type="jpeg", quality=60)
+        ARTIFACT_WRITER.submit(write_artifact, "Screenshot", screenshot_path, screenshot)
     except Exception as e:
-        print(f"Failed to save screenshot: {e}")
+        log.warning("Failed to save screenshot: %s", e)
 
     # Save HTML
-    html_path = artifacts_dir / f"{error_name}_{timestamp}.html"
+    html_path = ARTIFACTS_DIR / f"{error_name}_{timestamp}.html"
     try:
         html_content = page.content()
-        html_path.write_text(html_content)
-        print(f"HTML saved: {html_path}")
+        ARTIFACT_WRITER.submit(write_artifact, "HTML", html_path, html_content)
     except Exception as e:
-        print(f"Failed to save HTML: {e}")
+        log.warning("Failed to save HTML: %s", e)
 
 
 def ensure_no_captcha(page):
     """Fail fast if CAPTCHA is detected."""
-    # Look for actual reCAPTCHA elements that are visible and have size
-    captcha_selectors = [
-        "iframe[src*='recaptcha']",
-        ".g-recaptcha",
-        "#captcha",
-        "[class*='recaptcha']",
-    ]
-    for selector in captcha_selectors:
-        captcha_element = page.locator(selector).first
-        if captcha_element.count() > 0:
-            try:
-                # Check if it's actually visible and has dimensions
-                if captcha_element.is_visible():
-                    box = captcha_element.bounding_box()
-                    if box and box["width"] > 50 and box["height"] > 50:
-                        print("ERROR: CAPTCHA detected. Cannot proceed automatically.")
-                        save_debug_artifacts(page, "captcha_detected")
-                        raise Exception("CAPTCHA detected")
-            except Exception:
-                pass  # Element not interactable, skip
-
-
-def wait_for_network_idle(page, timeout=10000):
-    """Best-effort wait for network idle without hard-failing."""
+    # Look for actual reCAPTCHA elements that are visible and have size, checking
+    # every candidate selector in one evaluate instead of three calls each
+    if page.evaluate(CAPTCHA_VISIBLE_JS, list(SELECTORS["captcha"])):
+        log.error("ERROR: CAPTCHA detected. Cannot proceed automatically.")
+        save_debug_artifacts(page, "captcha_detected")
+        raise Exception("CAPTCHA detected")
+
+
+def wait_for_landing_page(page, timeout=15000):
+    """Wait for either the complaint form or the article's accordion to render."""
+    landing = page.locator(SELECTORS["problem_detail"]).or_(
+        page.get_by_text(RESIDENTIAL_SECTION_TEXT)
+    )
     try:
-        page.wait_for_load_state("networkidle", timeout=timeout)
+        landing.first.wait_for(state="visible", timeout=timeout)
     except PlaywrightTimeout:
-        pass
+        pass  # navigate_to_complaint_form falls back to the article page
+
+
+def probe_visible(locator, timeout=500):
+    """Return whether the locator is (or becomes) visible, in a single round-trip.
+
+    Replaces count() followed by is_visible(), which costs two calls per check.
+    """
+    try:
+        locator.wait_for(state="visible", timeout=timeout)
+        return True
+    except PlaywrightTimeout:
+        return False
+
+
+def wait_for_select_options(page, selector, timeout=15000):
+    """Wait until a dropdown has at least one non-placeholder option.
+
+    Re-checked on every animation frame (Playwright's default "raf" polling).
+    """
+    page.wait_for_function(
+        "selector => document.querySelector("
+        "selector + ' option[value]:not([value=\"\"])') !== null",
+        arg=selector,
+        timeout=timeout,
+    )
+
+
+def pick_option(select, preferences, field):
+    """Select the first preferred option a dropdown offers, else its first option.
+
+    Returns the selected option's text. Raises if the dropdown has no options,
+    so the step is never submitted with the required field left blank.
+    """
+    option = select.evaluate(PICK_OPTION_JS, list(preferences))
+    if option is None:
+        raise Exception(f"No {field} option available to select")
+    select.select_option(value=option["value"])
+    return option["text"]
+
+
+def is_form_postback(response):
+    """Match the document POST the wizard sends when a step is submitted."""
+    request = response.request
+    return (
+        request.method == "POST"
+        and request.resource_type == "document"
+        and urlparse(request.url).path.startswith(WIZARD_PATH)
+    )
+
+
+def click_and_wait_for_postback(page, button, action, timeout=15000):
+    """Click a wizard button and wait for the form POST it triggers.
+
+    Returns the response, or None if no postback arrived (e.g. client-side
+    validation kept the page open). Raises if the portal answers with an error.
+    """
+    try:
+        with page.expect_response(is_form_postback, timeout=timeout) as response_info:
+            button.click()
+        response = response_info.value
+    except PlaywrightTimeout:
+        log.warning("  - WARNING: No %s postback within %sms", action, timeout)
+        return None
+    if response.status >= 400:
+        save_debug_artifacts(page, f"{action}_postback_http_{response.status}")
+        raise Exception(f"{action.capitalize()} postback failed: HTTP {response.status}")
+    return response
 
 
 def get_current_step(page):
     """Return the current step number (1-4) based on the progress indicator."""
-    for step in [1, 2, 3, 4]:
-        # Active step typically has a distinct class or aria attribute
-        active = page.locator(
-            f".progress-step.active:has-text('{step}'), [aria-current='step']:has-text('{step}')"
-        ).first
-        if active.count() > 0:
-            return step
-    # Fallback: check for step-specific elements
-    if page.locator("#n311_problemdetailid_select").count() > 0:
-        return 1
-    if page.locator("#n311_locationtypeid_select").count() > 0:
-        return 2
-    if (
-        page.locator(
-            "fieldset[aria-label*='Contact'], input[id*='firstname']"
-        ).first.count()
-        > 0
-    ):
-        return 3
-    if page.get_by_role("button", name="Submit").count() > 0:
-        return 4
-    return None
+    # Active step typically has a distinct class or aria attribute; fall back
+    # to step-specific elements. Evaluated in the page to avoid a locator
+    # round-trip per candidate.
+    return page.evaluate(
+        GET_CURRENT_STEP_JS,
+        {
+            "activeStep": SELECTORS["active_step"],
+            "markers": list(STEP_MARKERS.items()),
+        },
+    )
 
 
 def wait_and_click_next(page, expected_next_step=None):
     """Wait for and click the Next/Continue button, then verify step transition."""
-    # Try multiple selectors for the Next button
-    next_button = page.get_by_role("button", name="Next").first
-    if next_button.count() == 0:
-        next_button = page.get_by_role("button", name="Continue").first
+    # The portal's wizard renders its Next button as #NextButton. The fallbacks
+    # are tried in order, not combined with or_(): .first on a combined locator
+    # picks by document order, so an earlier (possibly hidden) "Next" button or
+    # link elsewhere on the page would win over the wizard's own.
+    next_button = page.locator(SELECTORS["next_button"]).first
     if next_button.count() == 0:
-        next_button = page.locator(
-            "button:has-text('Next'), button:has-text('Continue'), "
-            "a:has-text('Next'), a:has-text('Continue'), "
-            "input[type='submit'][value*='Next'], input[type='submit'][value*='Continue'], "
-            "[role='button']:has-text('Next'), [role='button']:has-text('Continue')"
-        ).first
+        # One role query covers both labels before the long composite selector
+        next_button = page.get_by_role("button", name=NEXT_BUTTON_NAME_RE).first
+        if next_button.count() == 0:
+            next_button = page.locator(SELECTORS["next_button_fallback"]).first
 
     expect(next_button).to_be_visible(timeout=15000)
-    next_button.click()
-    wait_for_network_idle(page)
+    # Each Next posts the step back to the portal
+    click_and_wait_for_postback(page, next_button, "step")
 
-    # Verify we moved to the next step (if specified)
+    # Verify we moved to the next step (if specified) by waiting for an
+    # element that only that step renders
     if expected_next_step:
-        page.wait_for_timeout(1000)
-        current = get_current_step(page)
-        if current and current != expected_next_step:
+        marker = page.locator(STEP_MARKERS[expected_next_step]).first
+        try:
+            marker.wait_for(state="attached", timeout=15000)
+        except PlaywrightTimeout:
+            current = get_current_step(page)
             save_debug_artifacts(
                 page, f"step_transition_failed_expected_{expected_next_step}"
             )
@@ -249,162 +819,178 @@ def wait_and_click_next(page, expected_next_step=None):
 
 def on_complaint_form(page):
     """Determine whether the current page looks like the complaint form."""
-    return page.locator("#n311_problemdetailid_select").count() > 0
+    return page.locator(SELECTORS["problem_detail"]).count() > 0
+
+
+def click_report_button_via_ui(page):
+    """Expand the article accordion and click the report button via locators."""
+    # Expand "Residential Addresses" section
+    residential_section = page.get_by_text(RESIDENTIAL_SECTION_TEXT).first
+    try:
+        residential_section.wait_for(state="visible", timeout=10000)
+        residential_section.click()
+        log.info("  - Expanded 'Residential Addresses' section")
+    except PlaywrightTimeout:
+        log.info("  - No 'Residential Addresses' section found")
+
+    # Click the "Report rats or conditions that might attract them." button
+    # This is a JavaScript button that triggers createServiceRequest()
+    # The role query covers href links; onclick-only anchors have no link role,
+    # so the createServiceRequest trigger is matched by selector as well
+    report_button = (
+        page.get_by_role("link", name=REPORT_BUTTON_NAME_RE)
+        .or_(page.locator(SELECTORS["report_button_onclick"]))
+        .first
+    )
+    if not probe_visible(report_button, timeout=10000):
+        log.info("  - No 'Report rats' button found")
+        save_debug_artifacts(page, "no_report_button")
+        raise Exception("Could not find 'Report rats' button")
+
+    report_button.click()
+    log.info("  - Clicked 'Report rats' button")
 
 
 def navigate_to_complaint_form(page):
     """Navigate from Rat or Mouse Complaint article to the complaint form."""
-    print("Navigating to complaint form...")
+    log.info("Navigating to complaint form...")
 
     if on_complaint_form(page):
-        print("  - Already on complaint form")
+        log.info("  - Already on complaint form")
         return
 
     if not page.url.startswith(FORM_ARTICLE_URL):
         page.goto(FORM_ARTICLE_URL, wait_until="domcontentloaded")
-        wait_for_network_idle(page)
-
-    # Step 1: Expand "Residential Addresses" section
-    residential_section = page.locator("text=Residential Addresses").first
-    if residential_section.count() > 0:
-        expect(residential_section).to_be_visible(timeout=10000)
-        residential_section.click()
-        print("  - Expanded 'Residential Addresses' section")
 
-    # Step 2: Click the "Report rats or conditions that might attract them." button
-    # This is a JavaScript button that triggers createServiceRequest()
-    report_button = page.locator(
-        "a:has-text('Report rats or conditions that might attract them')"
-    ).first
-    if report_button.count() == 0:
-        # Try alternative - look for any DOHMH rat report button in expanded section
-        report_button = page.locator("a.btn:has-text('Report rats')").first
-    if report_button.count() == 0:
-        report_button = page.locator(
-            "a[onclick*='createServiceRequest']:has-text('Report rats')"
-        ).first
-
-    if report_button.count() > 0:
-        expect(report_button).to_be_visible(timeout=10000)
-        report_button.click()
-        wait_for_network_idle(page)
-        print("  - Clicked 'Report rats' button")
+    # Fast path: expand and click in one call instead of one per UI action
+    if page.evaluate(CLICK_REPORT_BUTTON_JS):
+        log.info("  - Clicked 'Report rats' button")
     else:
-        print("  - No 'Report rats' button found")
-        save_debug_artifacts(page, "no_report_button")
-        raise Exception("Could not find 'Report rats' button")
+        click_report_button_via_ui(page)
 
     # Wait for form to load
-    expect(page.locator("#n311_problemdetailid_select")).to_be_visible(timeout=15000)
+    expect(page.locator(SELECTORS["problem_detail"])).to_be_visible(timeout=15000)
 
 
-def fill_step1_what(page, description, nyc_datetime):
-    """Step 1: Fill in the 'What' details about the complaint."""
-    print("Step 1: Filling complaint details...")
+def fill_observed_datetime(page, datetime_str):
+    """Set Date/Time Observed (combined field with format M/D/YYYY h:mm A).
 
-    wait_for_network_idle(page)
+    Typed through Playwright rather than set via evaluate: the date picker
+    parses keyboard input and only commits the value on blur.
+    """
+    datetime_field = page.locator(SELECTORS["datetime_observed"]).first
+    if probe_visible(datetime_field):
+        datetime_field.click()
+        datetime_field.fill(datetime_str)
+        # Press Tab to close any date picker that might open
+        datetime_field.press("Tab")
+        log.info("  - Set Date/Time Observed: %s", datetime_str)
 
-    # Select "Condition Attracting Rodents" from Problem Detail dropdown
-    problem_detail = page.locator("#n311_problemdetailid_select")
-    expect(problem_detail).to_be_visible(timeout=15000)
-    problem_detail.select_option(label="Condition Attracting Rodents")
-    print("  - Selected 'Condition Attracting Rodents'")
 
-    # Fill Additional Details dropdown (appears after Problem Detail selection)
-    additional_details = page.locator(
-        "select[id*='additionaldetails'], select[id*='additional']"
-    ).first
-    try:
-        additional_details.wait_for(state="visible", timeout=5000)
-    except PlaywrightTimeout:
-        additional_details = None
+def fill_step1_details(page, additional_details, description, datetime_str):
+    """Fill the Step 1 fields after Problem Detail with one locator call per field.
 
-    if (
-        additional_details
-        and additional_details.count() > 0
-        and additional_details.is_visible()
-    ):
-        # Try preferred options in order (trash/garbage-related for rat complaints)
-        preferred_options = [
-            ADDITIONAL_DETAILS,
-            "Trash",
-            "Garbage",
-            "Improper",
-            "Open lot",
-            "Food",
-            "Waste",
-        ]
-        selected = False
-        for pref in preferred_options:
-            if additional_details.locator(f"option:has-text('{pref}')").count() > 0:
-                additional_details.select_option(
-                    label=additional_details.locator(
-                        f"option:has-text('{pref}')"
-                    ).first.text_content()
-                )
-                print(f"  - Selected Additional Details: {pref}")
-                selected = True
-                break
-
-        if not selected:
-            # Fallback to first non-empty option
-            additional_details.select_option(index=1)
-            print("  - Selected Additional Details: (first available)")
-
-    # Fill Description textarea
-    description_field = page.get_by_label("Description").first
-    if description_field.count() == 0:
-        description_field = page.locator("textarea:visible").first
+    additional_details is the visible Additional Details dropdown, or None.
+    """
+    # Fill Additional Details dropdown
+    if additional_details is not None:
+        # Try preferred options in order, falling back to the first one
+        selected = pick_option(
+            additional_details, ADDITIONAL_DETAILS_PREFERENCES, "Additional Details"
+        )
+        log.info("  - Selected Additional Details: %s", selected)
+
+    # Fill Description textarea, matched by its label within the Step 1 form
+    step_form = (
+        page.locator(SELECTORS["step_form"])
+        .filter(has=page.locator(SELECTORS["problem_detail"]))
+        .first
+    )
+    description_field = step_form.get_by_label("Description").first
     expect(description_field).to_be_visible(timeout=5000)
     description_field.fill(description)
-    print(f"  - Filled Description: {description[:50]}...")
-
-    # Set Date/Time Observed (combined field with format M/D/YYYY h:mm A)
-    datetime_str = nyc_datetime.strftime("%-m/%-d/%Y %-I:%M %p")
-    datetime_field = page.locator(
-        "input[id='n311_datetimeobserved']:visible, input[placeholder*='M/D/YYYY']:visible"
-    ).first
-    if datetime_field.count() > 0:
-        expect(datetime_field).to_be_visible(timeout=5000)
-        datetime_field.click()
-        datetime_field.fill(datetime_str)
-        # Press Tab to close any date picker that might open
-        datetime_field.press("Tab")
-        print(f"  - Set Date/Time Observed: {datetime_str}")
+    log.info("  - Filled Description: %s...", description[:50])
+
+    fill_observed_datetime(page, datetime_str)
 
     # Select "Yes" for recurring problem
-    recurring_group = page.locator(
-        "fieldset:has-text('recurring'), div:has-text('recurring')"
-    ).first
+    recurring_group = page.locator(SELECTORS["recurring_group"]).first
     if recurring_group.count() > 0:
         yes_radio = recurring_group.get_by_label("Yes")
     else:
         yes_radio = page.get_by_role("radio", name="Yes").first
     if yes_radio.count() > 0:
         yes_radio.check()
-        print("  - Selected 'Yes' for recurring problem")
+        log.info("  - Selected 'Yes' for recurring problem")
+
+
+def fill_step1_details_batched(page, has_additional_details, description, datetime_str):
+    """Fill the Step 1 fields after Problem Detail with a single page.evaluate.
+
+    Date/Time Observed is the exception and is typed by fill_observed_datetime.
+    Raises, like the locator path, if a required field could not be set.
+    """
+    result = page.evaluate(
+        FILL_STEP1_JS,
+        {
+            "additionalDetails": (
+                SELECTORS["additional_details"] if has_additional_details else None
+            ),
+            "preferences": list(ADDITIONAL_DETAILS_PREFERENCES),
+            "description": description,
+        },
+    )
+    if has_additional_details and "additionalDetails" not in result:
+        raise Exception("No Additional Details option available to select")
+    if not result.get("description"):
+        raise Exception("Description field not found")
+    if "additionalDetails" in result:
+        log.info("  - Selected Additional Details: %s", result["additionalDetails"])
+    log.info("  - Filled Description: %s...", description[:50])
+    fill_observed_datetime(page, datetime_str)
+    if result.get("recurring"):
+        log.info("  - Selected 'Yes' for recurring problem")
+
+
+def fill_step1_what(page, description, datetime_str):
+    """Step 1: Fill in the 'What' details about the complaint."""
+    log.info("Step 1: Filling complaint details...")
+
+    wait_for_select_options(page, SELECTORS["problem_detail"])
+
+    # Select "Condition Attracting Rodents" from Problem Detail dropdown
+    problem_detail = page.locator(SELECTORS["problem_detail"])
+    expect(problem_detail).to_be_visible(timeout=15000)
+    problem_detail.select_option(label="Condition Attracting Rodents")
+    log.info("  - Selected 'Condition Attracting Rodents'")
+
+    # Fill Additional Details dropdown (appears after Problem Detail selection)
+    additional_details = page.locator(SELECTORS["additional_details"]).first
+    if not probe_visible(additional_details, timeout=5000):
+        additional_details = None
+
+    if get_batch_fill():
+        fill_step1_details_batched(
+            page, additional_details is not None, description, datetime_str
+        )
+    else:
+        fill_step1_details(page, additional_details, description, datetime_str)
 
     # Click Next and verify we reach Step 2
     wait_and_click_next(page, expected_next_step=2)
-    print("Step 1 complete.")
+    log.info("Step 1 complete.")
 
 
 def fill_step2_where(page, config):
     """Step 2: Fill in the 'Where' location details."""
-    print("Step 2: Filling location details...")
-
-    wait_for_network_idle(page)
+    log.info("Step 2: Filling location details...")
 
     # Wait for Location Type dropdown to have options loaded
-    # Wait for options to be populated in the dropdown
-    page.wait_for_function(
-        "document.querySelector('#n311_locationtypeid_select option[value]:not([value=\"\"])') !== null",
-        timeout=15000,
-    )
-    print("  - Location Type options loaded")
+    wait_for_select_options(page, SELECTORS["location_type"])
+    log.info("  - Location Type options loaded")
 
     # Select Location Type - try multiple options for residential buildings
-    location_type = page.locator("#n311_locationtypeid_select")
+    location_type = page.locator(SELECTORS["location_type"])
     expect(location_type).to_be_visible(timeout=10000)
 
     # Try location types in order of preference
@@ -414,150 +1000,123 @@ def fill_step2_where(page, config):
         "1-2 Family Dwelling",
         "1-2 Family Mixed Use Building",
     ]
-    selected = False
-    for option in location_options:
-        if location_type.locator(f"option:has-text('{option}')").count() > 0:
-            location_type.select_option(label=option)
-            print(f"  - Selected Location Type: {option}")
-            selected = True
-            break
-
-    if not selected:
-        # Fallback: select first non-empty option
-        location_type.select_option(index=1)
-        print("  - Selected Location Type: (first available)")
-
-    wait_for_network_idle(page)
-
-    # Select Location Detail - required to enable the Address field
-    location_detail = page.locator("#n311_locationdetailid_select")
-    if location_detail.count() > 0:
-        # Wait for Location Detail options to load
-        try:
-            page.wait_for_function(
-                "document.querySelector('#n311_locationdetailid_select option[value]:not([value=\"\"])') !== null",
-                timeout=10000,
-            )
-            # Try to select appropriate option for building exterior
-            detail_options = [
-                "Exterior",
-                "Outside",
-                "Sidewalk",
-                "Street",
-                "Front",
-                "Building",
-            ]
-            selected = False
-            for opt in detail_options:
-                if location_detail.locator(f"option:has-text('{opt}')").count() > 0:
-                    location_detail.select_option(
-                        label=location_detail.locator(
-                            f"option:has-text('{opt}')"
-                        ).first.text_content()
-                    )
-                    print(f"  - Selected Location Detail: {opt}")
-                    selected = True
-                    break
-            if not selected:
-                location_detail.select_option(index=1)
-                print("  - Selected Location Detail: (first available)")
-            wait_for_network_idle(page)
-            # Wait for address field to become enabled
-            page.wait_for_timeout(1000)
-        except PlaywrightTimeout:
-            print("  - Location Detail options did not load")
+    # Falls back to the first non-empty option
+    selected = pick_option(location_type, location_options, "Location Type")
+    log.info("  - Selected Location Type: %s", selected)
+
+    # Select Location Detail - required to enable the Address field.
+    # Wait on Location Detail and the address search button together instead
+    # of probing one and then the other.
+    try:
+        ready = page.wait_for_function(
+            LOCATION_READY_JS,
+            arg={
+                "detail": SELECTORS["location_detail"],
+                "search": SELECTORS["address_search_button"],
+            },
+            timeout=10000,
+        ).json_value()
+    except PlaywrightTimeout:
+        ready = None
+        log.info("  - Location Detail options did not load")
+
+    location_detail = page.locator(SELECTORS["location_detail"])
+    if ready == "detail":
+        # Try to select appropriate option for building exterior
+        detail_options = [
+            "Exterior",
+            "Outside",
+            "Sidewalk",
+            "Street",
+            "Front",
+            "Building",
+        ]
+        selected = pick_option(location_detail, detail_options, "Location Detail")
+        log.info("  - Selected Location Detail: %s", selected)
 
     # Fill the Address lookup field
     # Click the address search button (inside the form, not header)
-    search_btn = page.locator("#SelectAddressWhere, .address-picker-btn").first
+    search_btn = page.locator(SELECTORS["address_search_button"]).first
     expect(search_btn).to_be_visible(timeout=5000)
+    # Address search stays disabled until Location Detail has been applied
+    expect(search_btn).to_be_enabled(timeout=5000)
     search_btn.click()
-    wait_for_network_idle(page)
-    print("  - Opened address search")
+    log.info("  - Opened address search")
 
     # Wait for modal/search input to appear - use the specific ID
-    modal_input = page.locator("#address-search-box-input").first
+    modal_input = page.locator(SELECTORS["address_search_input"]).first
     try:
         modal_input.wait_for(state="visible", timeout=5000)
 
-        # Clear and focus the input field
-        modal_input.click()
-        # Triple-click to select all (works on all platforms)
-        modal_input.click(click_count=3)
-        page.wait_for_timeout(200)
-        modal_input.press("Backspace")  # Clear
-        page.wait_for_timeout(500)
+        # Clear and focus the input field (fill focuses it first)
+        modal_input.fill("")
 
-        # Type address slowly to trigger autocomplete
+        # fill() sets the whole value in one call and fires the input event the
+        # autocomplete listens for, instead of typing one key every 100ms
         address_text = config["address"]
-        modal_input.type(
-            address_text, delay=100
-        )  # Type with delay to trigger autocomplete
-        print(f"  - Typed address: {address_text}")
-        page.wait_for_timeout(1000)  # Wait for autocomplete to react
+        modal_input.fill(address_text)
+        log.info("  - Typed address: %s", address_text)
 
         # Wait for autocomplete suggestions to appear
-        autocomplete_list = page.locator(".ui-autocomplete, .ui-menu").first
+        autocomplete_list = page.locator(SELECTORS["autocomplete_list"]).first
+        if not probe_visible(autocomplete_list, timeout=5000):
+            # Fall back to key events for widgets that ignore input events;
+            # the autocomplete debounce still collapses these into one search
+            modal_input.fill("")
+            modal_input.type(address_text, delay=20)
         try:
             autocomplete_list.wait_for(state="visible", timeout=5000)
-            print("  - Autocomplete suggestions appeared")
-
-            # Wait a moment for all suggestions to load
-            page.wait_for_timeout(500)
+            log.info("  - Autocomplete suggestions appeared")
 
             # Click on the first address suggestion (should match our typed address)
             # Look for suggestions containing the street name in any borough
-            suggestions = page.locator(".ui-menu-item, .ui-autocomplete li").all()
-            selected_suggestion = False
-            for suggestion in suggestions:
-                text = suggestion.text_content() or ""
-                # Check if this looks like a valid address (contains STREET/ST and a borough)
-                boroughs = ["MANHATTAN", "BROOKLYN", "QUEENS", "BRONX", "STATEN ISLAND"]
-                if any(b in text.upper() for b in boroughs):
-                    suggestion.click()
-                    wait_for_network_idle(page)
-                    print(f"  - Selected address from autocomplete: {text.strip()}")
-                    page.wait_for_timeout(3000)  # Wait for map to update and zoom
-                    selected_suggestion = True
-                    break
-
-            if not selected_suggestion:
+            # Read every suggestion's text in one call, then click by index
+            suggestion_items = page.locator(SELECTORS["autocomplete_item"])
+            texts = suggestion_items.all_text_contents()
+            match = next(
+                (
+                    i
+                    for i, text in enumerate(texts)
+                    if any(b in text.upper() for b in BOROUGHS)
+                ),
+                None,
+            )
+            if match is not None:
+                suggestion_items.nth(match).click()
+                log.info(
+                    "  - Selected address from autocomplete: %s", texts[match].strip()
+                )
+            elif texts:
                 # Fallback: click the first suggestion
-                first_suggestion = page.locator(
-                    ".ui-menu-item, .ui-autocomplete li"
-                ).first
-                if first_suggestion.count() > 0:
-                    first_suggestion.click()
-                    wait_for_network_idle(page)
-                    print("  - Selected first autocomplete suggestion")
-                    page.wait_for_timeout(3000)
+                suggestion_items.first.click()
+                log.info("  - Selected first autocomplete suggestion")
         except PlaywrightTimeout:
-            print("  - No autocomplete suggestions, trying Enter key")
+            log.info("  - No autocomplete suggestions, trying Enter key")
             modal_input.press("Enter")
-            wait_for_network_idle(page)
-            page.wait_for_timeout(3000)
 
         # Wait for "Select Address" button to become enabled
-        select_btn = page.locator("#SelectAddressMap").first
+        select_btn = page.locator(SELECTORS["select_address_button"]).first
         expect(select_btn).to_be_visible(timeout=5000)
 
-        # Wait for button to be enabled (not disabled)
+        # Wait for button to be enabled (not disabled) once the geocoded
+        # address has been applied to the map
         try:
             page.wait_for_function(
-                """() => {
-                    const btn = document.querySelector('#SelectAddressMap');
+                """selector => {
+                    const btn = document.querySelector(selector);
                     return btn && !btn.disabled;
                 }""",
+                arg=SELECTORS["select_address_button"],
                 timeout=15000,
             )
-            print("  - Select Address button enabled")
+            log.info("  - Select Address button enabled")
         except PlaywrightTimeout:
             # Save debug info and try alternative approaches
             save_debug_artifacts(page, "address_button_still_disabled")
-            print("  - WARNING: Select Address button still disabled")
+            log.warning("  - WARNING: Select Address button still disabled")
 
             # Try clicking on the map canvas to set a pin
-            map_canvas = page.locator(".modal canvas, .esri-view-surface canvas").first
+            map_canvas = page.locator(SELECTORS["map_canvas"]).first
             if map_canvas.count() > 0:
                 # Click in the center of the map
                 box = map_canvas.bounding_box()
@@ -565,175 +1124,91 @@ def fill_step2_where(page, config):
                     page.mouse.click(
                         box["x"] + box["width"] / 2, box["y"] + box["height"] / 2
                     )
-                    wait_for_network_idle(page)
-                    print("  - Clicked on map center")
-                    page.wait_for_timeout(2000)
+                    log.info("  - Clicked on map center")
 
+        # click() auto-waits for the button to become enabled
         select_btn.click()
-        wait_for_network_idle(page)
-        print("  - Clicked Select Address")
+        log.info("  - Clicked Select Address")
 
         # Wait for modal to close
-        page.wait_for_timeout(1000)
+        modal_input.wait_for(state="hidden", timeout=5000)
     except PlaywrightTimeout as e:
         save_debug_artifacts(page, "address_modal_failed")
         # Try to close any open modal by clicking Cancel or X
-        cancel_btn = page.locator(
-            "#CancelButton, .modal button[data-dismiss='modal'], .modal .close"
-        ).first
+        cancel_btn = page.locator(SELECTORS["modal_cancel"]).first
         if cancel_btn.count() > 0:
             try:
                 cancel_btn.click(timeout=2000)
-                wait_for_network_idle(page)
             except:
                 pass
-        print(f"  - WARNING: Address search issue: {e}")
+        log.warning("  - WARNING: Address search issue: %s", e)
         raise  # Re-raise to fail the step properly
 
     # Click Next and verify we reach Step 3
     wait_and_click_next(page, expected_next_step=3)
-    print("Step 2 complete.")
+    log.info("Step 2 complete.")
 
 
 def fill_step3_who(page, config):
     """Step 3: Fill contact information."""
-    print("Step 3: Filling contact info...")
-
-    wait_for_network_idle(page)
-
-    def fill_visible_field(field_name, selectors, value):
-        """Fill the first visible matching field."""
-        if not value:
-            return False
-
-        for selector in selectors:
-            locator = page.locator(selector)
-            count = locator.count()
-            for i in range(count):
-                candidate = locator.nth(i)
-                try:
-                    if candidate.is_visible():
-                        candidate.fill(value)
-                        print(f"  - Filled {field_name}: {value}")
-                        return True
-                except Exception:
-                    continue
-        return False
-
-    fill_visible_field(
-        "Contact First Name",
-        [
-            "input#n311_portaldobcontactfirstname:visible",
-            "input[id*='contactfirstname']:visible",
-            "input[id*='firstname']:visible",
-        ],
-        config["contact_first_name"],
-    )
-    fill_visible_field(
-        "Contact Last Name",
-        [
-            "input#n311_portaldobcontactlastname:visible",
-            "input[id*='contactlastname']:visible",
-            "input[id*='lastname']:visible",
-        ],
-        config["contact_last_name"],
-    )
-    fill_visible_field(
-        "Contact Email",
-        [
-            "input#n311_contactemail:visible",
-            "input[id*='contactemail']:visible",
-            "input[type='email']:visible",
-            "input[id*='email']:visible",
-        ],
-        config["contact_email"],
-    )
-    fill_visible_field(
-        "Contact Address Line 1",
-        [
-            "input#n311_portalcustomeraddressline1:visible",
-            "input[id*='addressline1']:visible",
-        ],
-        config["contact_address_line1"],
-    )
-    if config["contact_address_line2"]:
-        fill_visible_field(
-            "Contact Address Line 2",
-            [
-                "input#n311_portalcustomeraddressline2:visible",
-                "input[id*='addressline2']:visible",
-            ],
-            config["contact_address_line2"],
-        )
-    fill_visible_field(
-        "Contact City",
-        [
-            "input#n311_portalcustomeraddresscity:visible",
-            "input[id*='addresscity']:visible",
-            "input[id*='city']:visible",
-        ],
-        config["contact_city"],
-    )
-    fill_visible_field(
-        "Contact State",
-        [
-            "input#n311_portalcustomeraddressstate:visible",
-            "input[id*='addressstate']:visible",
-            "input[id*='state']:visible",
-        ],
-        config["contact_state"],
-    )
-    fill_visible_field(
-        "Contact ZIP",
-        [
-            "input#n311_portalcustomeraddresszip:visible",
-            "input[id*='addresszip']:visible",
-            "input[id*='zip']:visible",
-            "input[id*='postal']:visible",
-        ],
-        config["contact_zip"],
-    )
-    # Country is optional on many forms; fill when an input exists.
-    fill_visible_field(
-        "Contact Country",
-        [
-            "input[id*='country']:visible",
-        ],
-        config["contact_country"],
-    )
+    log.info("Step 3: Filling contact info...")
+
+    # SELECTORS and config share the same key for each contact field
+    contact_fields = [
+        ("Contact First Name", "contact_first_name"),
+        ("Contact Last Name", "contact_last_name"),
+        ("Contact Email", "contact_email"),
+        ("Contact Address Line 1", "contact_address_line1"),
+        ("Contact Address Line 2", "contact_address_line2"),
+        ("Contact City", "contact_city"),
+        ("Contact State", "contact_state"),
+        ("Contact ZIP", "contact_zip"),
+        # Country is optional on many forms; fill when an input exists.
+        ("Contact Country", "contact_country"),
+    ]
+    # Fill every contact field in one page.evaluate rather than probing and
+    # filling each candidate input separately
+    fields = [
+        {"name": field_name, "selectors": list(SELECTORS[key]), "value": config[key]}
+        for field_name, key in contact_fields
+        if config[key]
+    ]
+    filled = set(page.evaluate(FILL_VISIBLE_FIELDS_JS, fields))
+    for field in fields:
+        if field["name"] in filled:
+            log.info("  - Filled %s: %s", field["name"], field["value"])
 
     # Click Next and verify we reach Step 4 (Review)
     wait_and_click_next(page, expected_next_step=4)
-    print("Step 3 complete.")
+    log.info("Step 3 complete.")
 
 
 def fill_step4_review_and_submit(page, dry_run=False):
     """Step 4: Review and submit the complaint."""
-    print("Step 4: Review and submit...")
-
-    wait_for_network_idle(page)
+    log.info("Step 4: Review and submit...")
 
     # Log what's on the review page
-    print("  - Reviewing submission details...")
+    log.info("  - Reviewing submission details...")
 
     if dry_run:
-        print("  - DRY RUN: Skipping final submit")
-        print("Dry run completed successfully!")
+        log.info("  - DRY RUN: Skipping final submit")
+        log.info("Dry run completed successfully!")
         return True
 
     # Find and click Submit button (on review page it's "Complete and Submit")
-    submit_button = page.get_by_role("button", name="Complete and Submit")
-    if submit_button.count() == 0:
-        submit_button = page.locator(
-            "#NextButton.submit-btn, input[value*='Submit']"
-        ).first
-
+    submit_button = (
+        page.locator(SELECTORS["submit_button"])
+        .or_(page.locator(SELECTORS["submit_button_fallback"]))
+        .first
+    )
     expect(submit_button).to_be_visible(timeout=10000)
-    submit_button.click()
-    print("  - Clicked Submit")
-
-    # Wait for confirmation page
-    wait_for_network_idle(page)
+    # Wait on the submission POST itself rather than a fixed delay. Submitting
+    # is irreversible, so a missing postback fails the run instead of going on
+    # to scrape a page that may not be the confirmation.
+    if click_and_wait_for_postback(page, submit_button, "submit") is None:
+        save_debug_artifacts(page, "submit_no_postback")
+        raise Exception("Submission failed: no submit postback received")
+    log.info("  - Clicked Submit")
 
     # Must find confirmation - check for thank you message or confirmation number
     confirmation_found = False
@@ -741,36 +1216,163 @@ def fill_step4_review_and_submit(page, dry_run=False):
 
     try:
         # Wait for confirmation text to appear
-        page.get_by_text("Thank you", exact=False).wait_for(timeout=15000)
+        page.locator(SELECTORS["confirmation_text"]).first.wait_for(
+            state="visible", timeout=15000
+        )
         confirmation_found = True
     except PlaywrightTimeout:
-        # Check page content as fallback
-        page_text = page.content().lower()
-        if (
-            "thank you" in page_text
-            or "confirmation" in page_text
-            or "submitted" in page_text
-        ):
-            confirmation_found = True
+        pass
+
+    # Read the page text once; it serves both the broader wording fallback and
+    # the confirmation number search
+    page_text = page.evaluate(
+        CONFIRMATION_TEXT_JS, SELECTORS["confirmation_container"]
+    )
+    if not confirmation_found:
+        confirmation_found = CONFIRMATION_WORDS_RE.search(page_text) is not None
 
     if not confirmation_found:
         save_debug_artifacts(page, "submission_failed_no_confirmation")
         raise Exception("Submission failed: no confirmation message found")
 
-    # Try to extract confirmation number
-    confirmation_element = page.locator("text=/[A-Z0-9-]{6,}/").first
-    if confirmation_element.count() > 0:
-        confirmation_number = confirmation_element.text_content().strip()
-        print(f"Confirmation number: {confirmation_number}")
+    # Try to extract confirmation number from the main content's text
+    match = CONFIRMATION_NUMBER_RE.search(page_text)
+    if match:
+        confirmation_number = match.group(0)
+        log.info("Confirmation number: %s", confirmation_number)
     else:
-        print("  - No confirmation number found (but submission appears successful)")
+        log.info("  - No confirmation number found (but submission appears successful)")
 
-    print("Submission confirmed!")
+    log.info("Submission confirmed!")
     return True
 
 
+def new_submission_context(browser, storage_state):
+    """Create a submission context, restoring storage_state when it is accepted.
+
+    Returns (context, restored); a rejected state falls back to a fresh session.
+    """
+    options = {
+        "timezone_id": NYC_TIMEZONE,
+        "locale": "en-US",
+        "viewport": VIEWPORT,
+        "service_workers": "block",
+    }
+    if storage_state is not None:
+        try:
+            return browser.new_context(storage_state=storage_state, **options), True
+        except Exception as e:
+            log.warning("Saved browser state rejected (%s); starting fresh", e)
+    return browser.new_context(**options), False
+
+
+def run_submission(browser, config, description, datetime_str, state_path, dry_run):
+    """Submit one complaint in its own context on a shared browser.
+
+    Returns True on success, False on failure (after saving debug artifacts).
+    """
+    context = None
+    page = None
+    try:
+        # Reuse cookies from the previous run so the portal skips its
+        # first-visit session bootstrap
+        storage_state, state_started_at = load_storage_state(state_path)
+        context, restored = new_submission_context(browser, storage_state)
+        if not restored:
+            # A fresh session starts now; both saves below record this time
+            state_started_at = time.time()
+        context.route("**/*", block_unneeded_requests)
+        page = context.new_page()
+        page.set_default_timeout(15000)
+
+        log.info("Submitting for: %s", config["address"])
+
+        # Navigate to form
+        form_url = get_form_url()
+        log.info("Navigating to: %s", form_url)
+        page.goto(form_url, wait_until="domcontentloaded")
+        wait_for_landing_page(page)
+
+        ensure_no_captcha(page)
+
+        # Navigate to the complaint form
+        navigate_to_complaint_form(page)
+        ensure_no_captcha(page)
+        # Save as soon as the session is established so a failure in a later
+        # step still leaves the next run with warm cookies
+        save_storage_state(context, state_path, state_started_at)
+
+        # Execute form steps
+        fill_step1_what(page, description, datetime_str)
+        fill_step2_where(page, config)
+        fill_step3_who(page, config)
+        fill_step4_review_and_submit(page, dry_run=dry_run)
+
+        # Refresh with any cookies the portal rotated while filling the form
+        save_storage_state(context, state_path, state_started_at)
+        return True
+
+    except PlaywrightTimeout as e:
+        log.error("ERROR: Timeout waiting for element: %s", e)
+        if page is not None:
+            save_debug_artifacts(page, "timeout_error", full_page=get_debug())
+        return False
+    except Exception as e:
+        log.error("ERROR: %s", e)
+        if page is not None:
+            save_debug_artifacts(page, "error", full_page=get_debug())
+        return False
+    finally:
+        if context is not None:
+            context.close()
+
+
+def launch_browser(p, headless):
+    """Connect to the warm browser at CDP_URL if set, else launch Chromium.
+
+    Closing a connected browser only disconnects, so the warm process
+    outlives the run and the next one skips Chromium's cold start.
+    """
+    cdp_url = get_cdp_url()
+    if cdp_url:
+        log.info("Connecting to running browser: %s", cdp_url)
+        return p.chromium.connect_over_cdp(cdp_url)
+    return p.chromium.launch(headless=headless, args=CHROMIUM_ARGS)
+
+
+def run_submission_in_thread(config, description, datetime_str, state_path, dry_run, headless):
+    """Submit one complaint on a browser owned by the calling worker thread."""
+    with sync_playwright() as p:
+        browser = launch_browser(p, headless)
+        try:
+            return run_submission(
+                browser, config, description, datetime_str, state_path, dry_run
+            )
+        finally:
+            browser.close()
+
+
+def setup_logging():
+    """Send log records to stdout through a queue drained on a background thread.
+
+    Parallel workers then never contend on stdout; the listener is stopped
+    (and the queue flushed) at exit.
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    # The thread name tells parallel workers' lines apart (submit_0, submit_1, ...)
+    handler.setFormatter(logging.Formatter("[%(threadName)s] %(message)s"))
+    listener = QueueListener(log_queue, handler)
+    log.addHandler(QueueHandler(log_queue))
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
+
+
 def main():
     """Main entry point for the automation script."""
+    setup_logging()
     parser = argparse.ArgumentParser(description="Submit NYC 311 Rat Complaint")
     parser.add_argument(
         "--dry-run",
@@ -782,67 +1384,102 @@ def main():
         action="store_true",
         help="Run browser in headed mode (visible window)",
     )
+    parser.add_argument(
+        "--address",
+        action="append",
+        help="Street address to file for (repeatable; uses CITY/STATE/ZIP, "
+        "defaults to ADDRESS)",
+    )
     args = parser.parse_args()
 
     config = get_config()
-    nyc_datetime = get_current_datetime_nyc()
-    description = select_random_description()
-
-    print("=" * 60)
-    print("NYC 311 Rat Complaint Automation")
-    print("=" * 60)
-    print(f"Time (NYC): {nyc_datetime.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-    print(
-        f"Address: {config['address']}, {config['city']}, {config['state']} {config['zip']}"
-    )
-    print(f"Dry run: {args.dry_run}")
-    print("=" * 60)
-
-    browser = None
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=not args.headed)
-        context = browser.new_context(timezone_id="America/New_York", locale="en-US")
-        page = context.new_page()
-        page.set_default_timeout(15000)
-
-        try:
-            # Navigate to form
-            form_url = get_form_url()
-            print(f"Navigating to: {form_url}")
-            page.goto(form_url, wait_until="domcontentloaded")
-            wait_for_network_idle(page)
-
-            ensure_no_captcha(page)
-
-            # Navigate to the complaint form
-            navigate_to_complaint_form(page)
-            ensure_no_captcha(page)
+    if args.address:
+        configs = [dict(config, address=address) for address in args.address]
+    else:
+        configs = [config]
 
-            # Execute form steps
-            fill_step1_what(page, description, nyc_datetime)
-            fill_step2_where(page, config)
-            fill_step3_who(page, config)
-            fill_step4_review_and_submit(page, dry_run=args.dry_run)
+    log.info("=" * 60)
+    log.info("NYC 311 Rat Complaint Automation")
+    log.info("=" * 60)
+    log.info(
+        "Time (NYC): %s", get_current_datetime_nyc().strftime("%Y-%m-%d %H:%M:%S %Z")
+    )
+    for cfg in configs:
+        log.info(
+            "Address: %s, %s, %s %s",
+            cfg["address"],
+            cfg["city"],
+            cfg["state"],
+            cfg["zip"],
+        )
+    log.info("Dry run: %s", args.dry_run)
+    log.info("=" * 60)
+
+    ARTIFACTS_DIR.mkdir(exist_ok=True)
+    state_path = get_state_path()
+    jobs = [
+        (
+            cfg,
+            description,
+            # Formatted once; the form and the saved details share the string
+            format_observed_datetime(get_current_datetime_nyc()),
+        )
+        for cfg, description in zip(configs, select_random_descriptions(len(configs)))
+    ]
+    workers = get_workers(len(jobs))
 
+    try:
+        if workers > 1:
+            # Each worker launches its own browser; results come back in job order
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="submit"
+            ) as pool:
+                futures = [
+                    pool.submit(
+                        run_submission_in_thread,
+                        *job,
+                        state_path,
+                        args.dry_run,
+                        not args.headed,
+                    )
+                    for job in jobs
+                ]
+                results = [future.result() for future in futures]
+        else:
+            # One browser serves every address; each submission gets its own
+            # context so cookies and form state never leak between complaints
+            with sync_playwright() as p:
+                browser = launch_browser(p, not args.headed)
+                try:
+                    results = [
+                        run_submission(browser, *job, state_path, args.dry_run)
+                        for job in jobs
+                    ]
+                finally:
+                    browser.close()
+    finally:
+        # Flush debug artifacts still being written
+        ARTIFACT_WRITER.shutdown(wait=True)
+
+    succeeded = 0
+    for (cfg, description, datetime_str), ok in zip(jobs, results):
+        if ok:
             # Save submission details for notification
-            save_submission_details(config, description, nyc_datetime)
-
-            print("=" * 60)
-            print("SUCCESS: Complaint process completed!")
-            print("=" * 60)
-            return 0
-
-        except PlaywrightTimeout as e:
-            print(f"ERROR: Timeout waiting for element: {e}")
-            save_debug_artifacts(page, "timeout_error")
-            return 1
-        except Exception as e:
-            print(f"ERROR: {e}")
-            save_debug_artifacts(page, "error")
-            return 1
-        finally:
-            if browser:
-                browser.close()
+            save_submission_details(
+                cfg, description, datetime_str, append=succeeded > 0
+            )
+            succeeded += 1
+
+    log.info("=" * 60)
+    if succeeded == len(configs):
+        log.info("SUCCESS: Complaint process completed!")
+        log.info("=" * 60)
+        return 0
+    log.error(
+        "FAILED: %s of %s submissions failed", len(configs) - succeeded, len(configs)
+    )
+    log.info("=" * 60)
+    return 1
 
 
 if __name__ == "__main__":